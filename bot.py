@@ -6,7 +6,13 @@ import asyncio
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta
 import time
+import cProfile
+import pstats
+import functools
+import bisect
+import math
 from urllib.parse import urlencode
+from collections import OrderedDict, deque
 
 print("🚀 STARTING BOT...")
 
@@ -19,6 +25,16 @@ try:
     CLIENT_ID = config['id']
     CLIENT_SECRET = config['secret']
     MAIN_SERVER = 1437381878310109185  # Your main server ID
+    PROFILE_CACHE_SIZE = config.get('profile_cache_size', 1000)  # Max cached user profiles
+    PROFILE_CACHE_TTL = config.get('profile_cache_ttl', 86400)  # Seconds before a profile goes stale
+    MAX_JOIN_TARGETS = config.get('max_join_targets', 10)  # Max servers per !djoin
+    SLOW_COMMAND_THRESHOLD = config.get('slow_command_threshold', 2.0)  # Log commands slower than this (seconds)
+    REQUEST_TIMEOUT = config.get('request_timeout', 10)  # Seconds before a Discord API call times out
+    BREAKER_ERROR_RATE = config.get('breaker_error_rate', 0.5)  # Error rate that opens the circuit
+    BREAKER_MIN_REQUESTS = config.get('breaker_min_requests', 5)  # Requests needed before judging the error rate
+    BREAKER_WINDOW = config.get('breaker_window', 20)  # Recent requests tracked per endpoint
+    BREAKER_COOLDOWN = config.get('breaker_cooldown', 30)  # Seconds to stay open before probing
+    MAX_OUTAGE_REQUEUES = config.get('max_outage_requeues', 5)  # Outage retries per user in a job
     
     print(f"✅ Config loaded")
     print(f"🔑 Token: {BOT_TOKEN[:20]}...")
@@ -40,8 +56,271 @@ bot.remove_command("help")
 # Store server join times
 server_join_times = {}
 
+# Cached user profiles (user_id -> profile), least recently used first
+PROFILES_FILE = 'user_profiles.json'
+user_profiles = OrderedDict()
+
+def cache_user_profile(user_id, profile):
+    """Store a user profile we already got from Discord"""
+    user_id = str(user_id)
+    user_profiles[user_id] = {
+        'username': profile.get('username'),
+        'global_name': profile.get('global_name'),
+        'cached_at': time.time()
+    }
+    user_profiles.move_to_end(user_id)
+    
+    # Drop least recently used profiles over the limit
+    while len(user_profiles) > PROFILE_CACHE_SIZE:
+        user_profiles.popitem(last=False)
+
+def get_cached_profile(user_id):
+    """Get a cached profile, or None if missing or expired"""
+    user_id = str(user_id)
+    profile = user_profiles.get(user_id)
+    if not profile:
+        return None
+    
+    if time.time() - profile['cached_at'] > PROFILE_CACHE_TTL:
+        del user_profiles[user_id]
+        return None
+    
+    user_profiles.move_to_end(user_id)
+    return profile
+
+def format_user(user_id):
+    """Mention a user, with their username if we have it cached"""
+    profile = get_cached_profile(user_id)
+    if profile and profile.get('username'):
+        name = profile.get('global_name') or profile['username']
+        if len(name) > 16:
+            name = name[:15] + "…"
+        return f"<@{user_id}> ({discord.utils.escape_markdown(name)})"
+    return f"<@{user_id}>"
+
+def join_field_lines(lines, max_lines, more_label="more", limit=1024):
+    """Join lines for an embed field, staying under Discord's field length limit"""
+    shown = []
+    length = 0
+    for line in lines[:max_lines]:
+        # Leave room for the "... and N more" footer
+        if length + len(line) + 1 > limit - 40:
+            break
+        shown.append(line)
+        length += len(line) + 1
+    
+    text = "\n".join(shown)
+    if len(lines) > len(shown):
+        text += f"\n... and {len(lines) - len(shown)} {more_label}"
+    return text
+
+def load_profile_cache():
+    """Load cached profiles from disk, skipping expired ones"""
+    if not os.path.exists(PROFILES_FILE):
+        return
+    try:
+        with open(PROFILES_FILE, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        
+        now = time.time()
+        # Oldest first so the most recently cached end up at the LRU tail
+        for user_id, profile in sorted(saved.items(), key=lambda item: item[1].get('cached_at', 0)):
+            if now - profile.get('cached_at', 0) <= PROFILE_CACHE_TTL:
+                user_profiles[user_id] = profile
+        
+        while len(user_profiles) > PROFILE_CACHE_SIZE:
+            user_profiles.popitem(last=False)
+        print(f"📖 Loaded {len(user_profiles)} cached user profiles")
+    except Exception as e:
+        print(f"⚠️ Error loading profile cache: {e}")
+
+def save_profile_cache():
+    """Write cached profiles next to auths.txt"""
+    try:
+        with open(PROFILES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(user_profiles, f)
+    except Exception as e:
+        print(f"⚠️ Error saving profile cache: {e}")
+
+load_profile_cache()
+
+# Token metadata (user_id -> auth/validation/join history) with secondary indexes
+TOKEN_INDEX_FILE = 'token_index.json'
+token_records = {}
+auth_time_index = []  # Sorted (authorized_at, user_id)
+validated_time_index = []  # Sorted (validated_at, user_id)
+validity_index = {'valid': set(), 'invalid': set()}
+guild_members_index = {}  # guild_id -> set of user_ids added to it
+
+def get_token_record(user_id):
+    """Get or create the metadata record for a user"""
+    return token_records.setdefault(str(user_id), {
+        'authorized_at': None,
+        'validated_at': None,
+        'valid': None,
+        'joined': {}
+    })
+
+def reindex_time(index, user_id, old_time, new_time):
+    """Move a user to a new position in a sorted time index"""
+    if old_time is not None:
+        position = bisect.bisect_left(index, (old_time, user_id))
+        if position < len(index) and index[position] == (old_time, user_id):
+            del index[position]
+    bisect.insort(index, (new_time, user_id))
+
+def record_authorized(user_id):
+    """Record that a user (re)authorized the app"""
+    user_id = str(user_id)
+    record = get_token_record(user_id)
+    now = time.time()
+    reindex_time(auth_time_index, user_id, record['authorized_at'], now)
+    record['authorized_at'] = now
+
+def record_validation(user_id, valid):
+    """Record the result of checking a user's token"""
+    user_id = str(user_id)
+    record = get_token_record(user_id)
+    now = time.time()
+    reindex_time(validated_time_index, user_id, record['validated_at'], now)
+    record['validated_at'] = now
+    record['valid'] = valid
+    
+    validity_index['valid'].discard(user_id)
+    validity_index['invalid'].discard(user_id)
+    validity_index['valid' if valid else 'invalid'].add(user_id)
+
+def record_join(user_id, guild_id):
+    """Record that a user was added to a guild"""
+    user_id = str(user_id)
+    guild_id = str(guild_id)
+    get_token_record(user_id)['joined'][guild_id] = time.time()
+    guild_members_index.setdefault(guild_id, set()).add(user_id)
+
+def users_since(index, since):
+    """Get user IDs from a sorted time index at or after a timestamp"""
+    position = bisect.bisect_left(index, (since, ''))
+    return {user_id for _, user_id in index[position:]}
+
+def rebuild_token_indexes():
+    """Rebuild all secondary indexes from token_records"""
+    auth_time_index.clear()
+    validated_time_index.clear()
+    validity_index['valid'].clear()
+    validity_index['invalid'].clear()
+    guild_members_index.clear()
+    
+    for user_id, record in token_records.items():
+        if record.get('authorized_at') is not None:
+            auth_time_index.append((record['authorized_at'], user_id))
+        if record.get('validated_at') is not None:
+            validated_time_index.append((record['validated_at'], user_id))
+        if record.get('valid') is not None:
+            validity_index['valid' if record['valid'] else 'invalid'].add(user_id)
+        for guild_id in record.get('joined', {}):
+            guild_members_index.setdefault(guild_id, set()).add(user_id)
+    
+    auth_time_index.sort()
+    validated_time_index.sort()
+
+def load_token_index():
+    """Load token metadata from disk and build the indexes"""
+    try:
+        if os.path.exists(TOKEN_INDEX_FILE):
+            with open(TOKEN_INDEX_FILE, 'r', encoding='utf-8') as f:
+                token_records.update(json.load(f))
+        
+        # Seed records for users authorized before metadata was tracked, their times stay unknown
+        if os.path.exists('auths.txt'):
+            with open('auths.txt', 'r', encoding='utf-8') as auth_file:
+                for line in auth_file:
+                    parts = line.strip().split(',')
+                    if len(parts) >= 3:
+                        get_token_record(parts[0])
+        
+        rebuild_token_indexes()
+        untracked = sum(1 for record in token_records.values() if record.get('authorized_at') is None)
+        print(f"📖 Loaded token metadata for {len(token_records)} users ({untracked} with unknown auth time)")
+    except Exception as e:
+        print(f"⚠️ Error loading token index: {e}")
+
+def is_untracked_for_filters(user_id, filters, now):
+    """Check if a user is left out of filters only because their times are unknown"""
+    record = token_records.get(user_id, {})
+    authorized_at = record.get('authorized_at')
+    validated_at = record.get('validated_at')
+    valid = record.get('valid')
+    
+    # A filter with a known value already excludes them
+    if 'days' in filters and authorized_at is not None and authorized_at < now - filters['days'] * 86400:
+        return False
+    if 'validated' in filters and validated_at is not None and validated_at < now - filters['validated'] * 86400:
+        return False
+    if filters.get('valid') and valid is False:
+        return False
+    
+    if 'days' in filters and authorized_at is None:
+        return True
+    if 'validated' in filters and validated_at is None:
+        return True
+    if filters.get('valid') and valid is None:
+        return True
+    return False
+
+def save_token_index():
+    """Write token metadata next to auths.txt"""
+    try:
+        with open(TOKEN_INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump(token_records, f)
+    except Exception as e:
+        print(f"⚠️ Error saving token index: {e}")
+
+load_token_index()
+
+# Per-handler timing stats (name -> calls/total/max) and event loop lag samples
+command_timings = {}
+loop_lag_samples = deque(maxlen=600)
+LOOP_LAG_INTERVAL = 0.5
+
+# Background lag sampler and active cProfile session, if any
+loop_lag_task = None
+active_profiler = None
+PROFILING_DIR = 'profiling'
+MAX_PROFILE_SECONDS = 3600
+
+def timed(func):
+    """Record wall time and event loop lag for a command or event handler"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started_at = time.monotonic()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - started_at
+            lag = max((sample_lag for sampled_at, sample_lag in loop_lag_samples if sampled_at >= started_at), default=0.0)
+            
+            stats = command_timings.setdefault(func.__name__, {'calls': 0, 'total': 0.0, 'max': 0.0, 'max_lag': 0.0})
+            stats['calls'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['max_lag'] = max(stats['max_lag'], lag)
+            
+            if elapsed >= SLOW_COMMAND_THRESHOLD:
+                print(f"🐢 Slow handler {func.__name__}: {elapsed:.2f}s (max loop lag {lag:.2f}s)")
+    return wrapper
+
+async def monitor_loop_lag():
+    """Sample how late the event loop wakes us up"""
+    while True:
+        expected_at = time.monotonic() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        now = time.monotonic()
+        loop_lag_samples.append((now, max(0.0, now - expected_at)))
+
 @bot.event
+@timed
 async def on_ready():
+    global loop_lag_task
     print(f'🎯 Bot is ready: {bot.user}')
     print(f'📋 Loaded commands: {[command.name for command in bot.commands]}')
     
@@ -53,8 +332,13 @@ async def on_ready():
     
     # Start the cleanup task
     check_server_ages.start()
+    
+    # Start sampling event loop lag for command timings
+    if loop_lag_task is None or loop_lag_task.done():
+        loop_lag_task = asyncio.create_task(monitor_loop_lag())
 
 @tasks.loop(hours=24)  # Run once per day
+@timed
 async def check_server_ages():
     """Check servers and leave if they're older than 14 days (except main server)"""
     print("🔍 Checking server ages...")
@@ -106,6 +390,7 @@ async def check_server_ages():
             print(f"✅ Server {guild_name} is {guild_age.days} days old - OK")
 
 @bot.event
+@timed
 async def on_guild_join(guild):
     """Track when bot joins a new server"""
     if guild.id != MAIN_SERVER:
@@ -127,6 +412,7 @@ async def on_guild_join(guild):
                     break
 
 @bot.event
+@timed
 async def on_guild_remove(guild):
     """Remove server from tracking when bot leaves"""
     if guild.id in server_join_times:
@@ -134,12 +420,82 @@ async def on_guild_remove(guild):
         print(f"🗑️ Removed tracking for server: {guild.name} ({guild.id})")
 
 @bot.event
+@timed
 async def on_command_error(ctx, error):
     if isinstance(error, commands.CommandNotFound):
         await ctx.send(f"❌ Command not found. Use `!help` to see available commands.")
+    elif isinstance(error, commands.NotOwner):
+        await ctx.send("❌ Only the bot owner can use this command.")
     else:
         print(f"❌ Command error: {error}")
 
+# Circuit breakers for the Discord REST API (endpoint -> state)
+circuit_breakers = {}
+
+class DiscordOutage(Exception):
+    """Raised when Discord is failing or a circuit breaker is open"""
+    def __init__(self, endpoint, retry_after, reason):
+        super().__init__(f"Discord API outage on {endpoint}: {reason}")
+        self.endpoint = endpoint
+        self.retry_after = max(1.0, retry_after)
+
+def get_breaker(endpoint):
+    """Get or create the circuit breaker for an endpoint"""
+    return circuit_breakers.setdefault(endpoint, {
+        'state': 'closed',
+        'outcomes': deque(maxlen=BREAKER_WINDOW),
+        'opened_at': 0.0
+    })
+
+def record_breaker_result(endpoint, ok):
+    """Track a request outcome and open or close the breaker"""
+    breaker = get_breaker(endpoint)
+    breaker['outcomes'].append(ok)
+    
+    if ok:
+        if breaker['state'] == 'half_open':
+            breaker['state'] = 'closed'
+            breaker['outcomes'].clear()
+            print(f"✅ Circuit closed for {endpoint} - Discord API recovered")
+        return
+    
+    outcomes = breaker['outcomes']
+    error_rate = outcomes.count(False) / len(outcomes)
+    if breaker['state'] == 'half_open' or (len(outcomes) >= BREAKER_MIN_REQUESTS and error_rate >= BREAKER_ERROR_RATE):
+        if breaker['state'] != 'open':
+            print(f"🔌 Circuit opened for {endpoint} - error rate {error_rate:.0%}, pausing for {BREAKER_COOLDOWN}s")
+        breaker['state'] = 'open'
+        breaker['opened_at'] = time.monotonic()
+
+def breaker_wait(breaker):
+    """Seconds to wait before retrying after a failed request"""
+    return BREAKER_COOLDOWN if breaker['state'] == 'open' else 1.0
+
+def discord_request(endpoint, method, url, **kwargs):
+    """Send a Discord API request through the endpoint's circuit breaker"""
+    breaker = get_breaker(endpoint)
+    
+    if breaker['state'] == 'open':
+        remaining = BREAKER_COOLDOWN - (time.monotonic() - breaker['opened_at'])
+        if remaining > 0:
+            raise DiscordOutage(endpoint, remaining, "circuit open")
+        # Cooldown is over, let this request through as a probe
+        breaker['state'] = 'half_open'
+        print(f"🔎 Circuit half-open for {endpoint} - probing Discord API")
+    
+    try:
+        response = requests.request(method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+    except (requests.Timeout, requests.ConnectionError) as e:
+        record_breaker_result(endpoint, False)
+        raise DiscordOutage(endpoint, breaker_wait(breaker), str(e))
+    
+    if response.status_code >= 500:
+        record_breaker_result(endpoint, False)
+        raise DiscordOutage(endpoint, breaker_wait(breaker), f"HTTP {response.status_code}")
+    
+    record_breaker_result(endpoint, True)
+    return response
+
 def refresh_access_token(refresh_token):
     """Refresh an expired access token"""
     try:
@@ -150,12 +506,14 @@ def refresh_access_token(refresh_token):
             'refresh_token': refresh_token
         }
         
-        response = requests.post('https://discord.com/api/v10/oauth2/token', data=data)
+        response = discord_request('oauth2/token', 'POST', 'https://discord.com/api/v10/oauth2/token', data=data)
         if response.status_code == 200:
             return response.json()
         else:
             print(f"❌ Token refresh failed: {response.status_code} - {response.text}")
             return None
+    except DiscordOutage:
+        raise
     except Exception as e:
         print(f"❌ Token refresh error: {e}")
         return None
@@ -164,9 +522,11 @@ def get_valid_token(user_id, access_token, refresh_token):
     """Get a valid access token, refreshing if needed"""
     # First test if current token works
     headers = {'Authorization': f'Bearer {access_token}'}
-    test_response = requests.get('https://discord.com/api/v10/users/@me', headers=headers)
+    test_response = discord_request('users/@me', 'GET', 'https://discord.com/api/v10/users/@me', headers=headers)
     
     if test_response.status_code == 200:
+        cache_user_profile(user_id, test_response.json())
+        record_validation(user_id, True)
         return access_token  # Token is still valid
     
     # Token is invalid, try to refresh
@@ -176,9 +536,11 @@ def get_valid_token(user_id, access_token, refresh_token):
     if new_tokens:
         # Update the token in auths.txt
         update_token_in_file(user_id, new_tokens['access_token'], new_tokens['refresh_token'])
+        record_validation(user_id, True)
         return new_tokens['access_token']
     else:
         print(f"❌ Failed to refresh token for user {user_id}")
+        record_validation(user_id, False)
         return None
 
 def update_token_in_file(user_id, new_access_token, new_refresh_token):
@@ -218,6 +580,7 @@ def update_token_in_file(user_id, new_access_token, new_refresh_token):
         return False
 
 @bot.hybrid_command(name='get_token')
+@timed
 async def get_auth_token(ctx):
     """Get authentication link - FIXED VERSION"""
     try:
@@ -266,6 +629,7 @@ async def get_auth_token(ctx):
         print(f"❌ Error in get_token: {e}")
 
 @bot.hybrid_command(name='auth')
+@timed
 async def authenticate_user(ctx, authorization_code: str):
     """Authenticate user with code"""
     try:
@@ -286,7 +650,7 @@ async def authenticate_user(ctx, authorization_code: str):
         }
         
         await msg.edit(content="🔄 Exchanging code for token...")
-        token_response = requests.post('https://discord.com/api/v10/oauth2/token', data=token_data)
+        token_response = discord_request('oauth2/token', 'POST', 'https://discord.com/api/v10/oauth2/token', data=token_data)
         
         if token_response.status_code != 200:
             error_info = token_response.json()
@@ -341,6 +705,12 @@ async def authenticate_user(ctx, authorization_code: str):
             await ctx.send(f"❌ Error saving authentication: {e}")
             return
         
+        cache_user_profile(current_user_id, {'username': ctx.author.name, 'global_name': ctx.author.global_name})
+        save_profile_cache()
+        record_authorized(current_user_id)
+        record_validation(current_user_id, True)
+        save_token_index()
+        
         success_embed = discord.Embed(
             title="✅ AUTHENTICATION SUCCESSFUL!",
             description=f"**{username}** is now authenticated!",
@@ -352,35 +722,82 @@ async def authenticate_user(ctx, authorization_code: str):
         await msg.edit(content="", embed=success_embed)
         print(f"✅ Authentication completed for user {current_user_id}")
         
+    except DiscordOutage as outage:
+        await ctx.send(f"❌ Discord API is having problems right now. Please try `!auth` again in {outage.retry_after:.0f} seconds.")
+        print(f"❌ {outage}")
     except Exception as error:
         await ctx.send(f"❌ Error: {str(error)}")
         print(f"❌ Exception: {error}")
         
+def add_member_to_guild(guild_id, user_id, access_token):
+    """Add a user to a guild with their OAuth token, returns the response"""
+    api_url = f"https://discord.com/api/v10/guilds/{guild_id}/members/{user_id}"
+    join_data = {"access_token": access_token}
+    headers = {
+        "Authorization": f"Bot {BOT_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    return discord_request('guilds/members', 'PUT', api_url, headers=headers, json=join_data)
+
 @bot.hybrid_command(name='djoin')
-async def join_server(ctx, target_server_id: str):
-    """Add ALL authenticated users to a server - WITH TOKEN REFRESH"""
+@timed
+async def join_server(ctx, *, target_server_ids: str):
+    """Add authenticated users to one or more servers - WITH TOKEN REFRESH
+    
+    Filters: days=N (authorized in last N days), validated=N (validated in
+    last N days), valid (token currently valid), new (not yet added)
+    """
     try:
-        # Check if bot is in the target server first
-        bot_in_server = False
-        server_name = "Unknown"
+        # Accept IDs separated by spaces or commas, keeping order and dropping duplicates
+        server_ids = []
+        filters = {}
+        for arg in target_server_ids.replace(',', ' ').split():
+            if arg.isdigit():
+                if arg not in server_ids:
+                    server_ids.append(arg)
+            elif arg.lower() in ('valid', 'new'):
+                filters[arg.lower()] = True
+            elif '=' in arg and arg.split('=', 1)[0].lower() in ('days', 'validated'):
+                name, value = arg.split('=', 1)
+                try:
+                    days = float(value)
+                except ValueError:
+                    days = None
+                if days is None or not math.isfinite(days) or days <= 0:
+                    await ctx.send(f"❌ Invalid filter `{arg}`. `{name.lower()}=N` needs a positive number of days.")
+                    return
+                filters[name.lower()] = days
+            else:
+                await ctx.send(f"❌ Unknown filter `{arg}`. Use `days=N`, `validated=N`, `valid` or `new`.")
+                return
+        
+        if not server_ids:
+            await ctx.send("❌ Usage: `!djoin SERVER_ID [SERVER_ID ...] [days=N] [validated=N] [valid] [new]`")
+            return
+        
+        if len(server_ids) > MAX_JOIN_TARGETS:
+            await ctx.send(f"❌ You can target at most **{MAX_JOIN_TARGETS}** servers at once.")
+            return
         
+        # Check if bot is in every target server first
+        server_names = {}
         for guild in bot.guilds:
-            if str(guild.id) == target_server_id:
-                bot_in_server = True
-                server_name = guild.name
-                break
+            if str(guild.id) in server_ids:
+                server_names[str(guild.id)] = guild.name
         
-        if not bot_in_server:
+        missing_servers = [server_id for server_id in server_ids if server_id not in server_names]
+        if missing_servers:
             invite_url = f"https://discord.com/oauth2/authorize?client_id={CLIENT_ID}&permissions=8&scope=bot%20applications.commands"
+            missing_text = ", ".join(f"`{server_id}`" for server_id in missing_servers)
             
             embed = discord.Embed(
                 title="❌ BOT NOT IN SERVER",
-                description=f"Bot is not in server `{target_server_id}`",
+                description=f"Bot is not in server(s) {missing_text}",
                 color=0xED4245
             )
             embed.add_field(
                 name="🚨 Solution", 
-                value=f"**[Add bot to server first]({invite_url})**\nThen use `!djoin {target_server_id}` again",
+                value=f"**[Add bot to server first]({invite_url})**\nThen use `!djoin {' '.join(server_ids)}` again",
                 inline=False
             )
             await ctx.send(embed=embed)
@@ -390,17 +807,40 @@ async def join_server(ctx, target_server_id: str):
             await ctx.send("❌ No users are authenticated yet. Use `!get_token` to share with users.")
             return
         
-        # Read all authenticated users
+        # Pick the cohort from the token indexes (None = everyone)
+        cohort = None
+        now = time.time()
+        if 'days' in filters:
+            cohort = users_since(auth_time_index, now - filters['days'] * 86400)
+        if 'validated' in filters:
+            recently_validated = users_since(validated_time_index, now - filters['validated'] * 86400)
+            cohort = recently_validated if cohort is None else cohort & recently_validated
+        if filters.get('valid'):
+            cohort = set(validity_index['valid']) if cohort is None else cohort & validity_index['valid']
+        
+        # Users already added to each target, skipped when filtering for new users
+        already_joined = {
+            server_id: guild_members_index.get(server_id, set()) if filters.get('new') else set()
+            for server_id in server_ids
+        }
+        
+        # Read authenticated users in the cohort
         authenticated_users = []
+        untracked_count = 0
         with open('auths.txt', 'r') as auth_file:
             for line_num, line in enumerate(auth_file, 1):
                 line = line.strip()
                 if not line:
                     continue
-                    
                 parts = line.split(',')
                 if len(parts) >= 3:
                     user_id = parts[0]
+                    if cohort is not None and user_id not in cohort:
+                        if is_untracked_for_filters(user_id, filters, now):
+                            untracked_count += 1
+                        continue
+                    if all(user_id in already_joined[server_id] for server_id in server_ids):
+                        continue
                     access_token = parts[1]
                     refresh_token = parts[2] if len(parts) > 2 else ""
                     authenticated_users.append({
@@ -410,91 +850,176 @@ async def join_server(ctx, target_server_id: str):
                         'line_number': line_num
                     })
         
+        # Users authorized before metadata was tracked have unknown times
+        untracked_note = ""
+        if untracked_count:
+            untracked_note = f"\n⚠️ Skipped **{untracked_count}** users with unknown auth/validation time. Run `!check_tokens` to record validation; auth time is only known after they `!auth` again."
+        
         if not authenticated_users:
-            await ctx.send("❌ No valid authenticated users found in auths.txt")
+            if filters:
+                await ctx.send(f"❌ No authenticated users match the filters{untracked_note}")
+            else:
+                await ctx.send("❌ No valid authenticated users found in auths.txt")
             return
         
         total_users = len(authenticated_users)
-        status_msg = await ctx.send(f"🚀 **MASS JOIN STARTED**\nAdding **{total_users}** authenticated users to **{server_name}**...\n🔄 Checking token validity...")
+        targets_text = ", ".join(f"**{server_names[server_id]}**" for server_id in server_ids)
+        status_msg = await ctx.send(f"🚀 **MASS JOIN STARTED**\nAdding **{total_users}** authenticated users to {targets_text}...\n🔄 Checking token validity...{untracked_note}")
         
-        success_count = 0
-        failed_count = 0
+        # Per-server results
+        results = {
+            server_id: {'success': 0, 'failed': 0, 'joined': []}
+            for server_id in server_ids
+        }
+        token_failed = 0
         token_refreshed = 0
-        joined_members = []
-        
-        # Process each user with token validation
-        for index, user_data in enumerate(authenticated_users):
+        requeued_count = 0
+        processed = 0
+        
+        # Work queue, so users hit by a Discord outage can be retried instead of failed
+        pending_users = deque(authenticated_users)
+        for user_data in authenticated_users:
+            user_data['pending_servers'] = [server_id for server_id in server_ids if user_data['user_id'] not in already_joined[server_id]]
+            user_data['valid_token'] = None
+            user_data['requeues'] = 0
+        
+        # Process each user: prepare the token once, then add them to every server
+        while pending_users:
+            user_data = pending_users.popleft()
             user_id = user_data['user_id']
             access_token = user_data['access_token']
             refresh_token = user_data['refresh_token']
             
             # Update status every 10 users
-            if index % 10 == 0:
-                await status_msg.edit(content=f"🚀 **MASS JOIN IN PROGRESS**\nProcessing {index+1}/{total_users} users...\n✅ Successful: {success_count} | ❌ Failed: {failed_count} | 🔄 Refreshed: {token_refreshed}")
+            if processed % 10 == 0:
+                success_count = sum(result['success'] for result in results.values())
+                failed_count = sum(result['failed'] for result in results.values())
+                try:
+                    await status_msg.edit(content=f"🚀 **MASS JOIN IN PROGRESS**\nProcessing {processed+1}/{total_users} users across {len(server_ids)} server(s)...\n✅ Successful: {success_count} | ❌ Failed: {failed_count} | 🔄 Refreshed: {token_refreshed} | ⏸️ Requeued: {requeued_count}")
+                except discord.HTTPException as e:
+                    # A failed progress update must never stop the job
+                    print(f"⚠️ Could not update mass join status: {e}")
             
             try:
-                # Get valid token (refresh if needed)
-                valid_token = get_valid_token(user_id, access_token, refresh_token)
-                
-                if not valid_token:
-                    print(f"❌ No valid token for user {user_id}, skipping...")
-                    failed_count += 1
-                    continue
+                if not user_data['valid_token']:
+                    # Get valid token (refresh if needed)
+                    valid_token = get_valid_token(user_id, access_token, refresh_token)
+                    
+                    if not valid_token:
+                        print(f"❌ No valid token for user {user_id}, skipping...")
+                        token_failed += 1
+                        for server_id in user_data['pending_servers']:
+                            results[server_id]['failed'] += 1
+                        processed += 1
+                        continue
+                    
+                    # If token was refreshed, count it
+                    if valid_token != access_token:
+                        token_refreshed += 1
+                    user_data['valid_token'] = valid_token
                 
-                # If token was refreshed, count it
-                if valid_token != access_token:
-                    token_refreshed += 1
+                while user_data['pending_servers']:
+                    server_id = user_data['pending_servers'][0]
+                    result = results[server_id]
+                    try:
+                        response = add_member_to_guild(server_id, user_id, user_data['valid_token'])
+                        
+                        if response.status_code in (201, 204):
+                            result['success'] += 1
+                            result['joined'].append(f"✅ {format_user(user_id)} - Added successfully")
+                            record_join(user_id, server_id)
+                            print(f"✅ Added user {user_id} to server {server_id}")
+                        else:
+                            result['failed'] += 1
+                            error_msg = response.json().get('message', 'Unknown error') if response.content else 'No details'
+                            print(f"❌ Failed to add user {user_id} to {server_id}: {response.status_code} - {error_msg}")
+                        
+                    except DiscordOutage:
+                        raise
+                    except Exception as e:
+                        result['failed'] += 1
+                        print(f"❌ Exception adding user {user_id} to {server_id}: {e}")
+                    
+                    user_data['pending_servers'].pop(0)
+                    
+                    # Increased delay to avoid rate limits
+                    await asyncio.sleep(1)
                 
-                api_url = f"https://discord.com/api/v10/guilds/{target_server_id}/members/{user_id}"
-                join_data = {"access_token": valid_token}
-                headers = {
-                    "Authorization": f"Bot {BOT_TOKEN}",
-                    "Content-Type": "application/json"
-                }
+                processed += 1
                 
-                response = requests.put(api_url, headers=headers, json=join_data)
+            except DiscordOutage as outage:
+                user_data['requeues'] += 1
                 
-                if response.status_code in (201, 204):
-                    success_count += 1
-                    joined_members.append(f"✅ <@{user_id}> - Added successfully")
-                    print(f"✅ Added user {user_id} to server {target_server_id}")
-                else:
-                    failed_count += 1
-                    error_msg = response.json().get('message', 'Unknown error') if response.content else 'No details'
-                    print(f"❌ Failed to add user {user_id}: {response.status_code} - {error_msg}")
+                if user_data['requeues'] > MAX_OUTAGE_REQUEUES:
+                    print(f"❌ Giving up on user {user_id} after {MAX_OUTAGE_REQUEUES} outage retries")
+                    for server_id in user_data['pending_servers']:
+                        results[server_id]['failed'] += 1
+                    processed += 1
+                    continue
                 
-                # Increased delay to avoid rate limits
-                await asyncio.sleep(1)
+                # Put the user back and pause until the breaker allows a probe
+                pending_users.append(user_data)
+                requeued_count += 1
+                print(f"⏸️ Requeued user {user_id}: {outage}")
+                try:
+                    await status_msg.edit(content=f"⏸️ **MASS JOIN PAUSED**\nDiscord API is having problems (`{outage.endpoint}`), retrying in {outage.retry_after:.0f}s...\nProcessed {processed}/{total_users} users | ⏸️ Requeued: {requeued_count}")
+                except discord.HTTPException as e:
+                    # A failed progress update must never stop the job
+                    print(f"⚠️ Could not update mass join status: {e}")
+                await asyncio.sleep(outage.retry_after)
                 
             except Exception as e:
-                failed_count += 1
-                print(f"❌ Exception adding user {user_id}: {e}")
+                print(f"❌ Exception preparing token for user {user_id}: {e}")
+                token_failed += 1
+                for server_id in user_data['pending_servers']:
+                    results[server_id]['failed'] += 1
+                processed += 1
         
         # Final results
+        success_count = sum(result['success'] for result in results.values())
+        failed_count = sum(result['failed'] for result in results.values())
+        
         final_embed = discord.Embed(
             title="🎯 MASS JOIN COMPLETED",
-            description=f"**Server:** {server_name}\n**Total Processed:** {total_users} users",
+            description=f"**Servers:** {len(server_ids)}\n**Total Processed:** {total_users} users",
             color=0x57F287 if success_count > 0 else 0xED4245
         )
         
         final_embed.add_field(name="✅ Successful", value=success_count, inline=True)
         final_embed.add_field(name="❌ Failed", value=failed_count, inline=True)
         final_embed.add_field(name="🔄 Tokens Refreshed", value=token_refreshed, inline=True)
-        
-        if joined_members:
-            success_text = "\n".join(joined_members[:10])  # Show first 10
-            if len(joined_members) > 10:
-                success_text += f"\n... and {len(joined_members) - 10} more"
-            final_embed.add_field(name="Successfully Joined", value=success_text, inline=False)
+        final_embed.add_field(name="🔑 Token Failures", value=token_failed, inline=True)
+        if requeued_count:
+            final_embed.add_field(name="⏸️ Outage Retries", value=requeued_count, inline=True)
+        if untracked_count:
+            final_embed.add_field(name="⚠️ Unknown Times (skipped)", value=untracked_count, inline=True)
+        
+        # One results table per server
+        shown_members = 10 if len(server_ids) == 1 else 3
+        for server_id in server_ids:
+            result = results[server_id]
+            server_text = f"✅ {result['success']} | ❌ {result['failed']}"
+            
+            if result['joined']:
+                server_text += "\n" + "\n".join(result['joined'][:shown_members])
+                if len(result['joined']) > shown_members:
+                    server_text += f"\n... and {len(result['joined']) - shown_members} more"
+            
+            final_embed.add_field(name=f"🏠 {server_names[server_id]} ({server_id})", value=server_text, inline=False)
         
         await status_msg.edit(content="", embed=final_embed)
-        print(f"✅ Mass join completed: {success_count} successful, {failed_count} failed")
+        print(f"✅ Mass join completed: {success_count} successful, {failed_count} failed across {len(server_ids)} server(s)")
         
     except Exception as error:
         await ctx.send(f"❌ Mass join error: {str(error)}")
         print(f"❌ MASS JOIN EXCEPTION: {error}")
+    finally:
+        # Keep join history and profiles recorded so far, even if the job aborted
+        save_profile_cache()
+        save_token_index()
 
 @bot.hybrid_command(name='check_tokens')
+@timed
 async def check_token_validity(ctx):
     """Check which tokens are still valid"""
     try:
@@ -505,6 +1030,7 @@ async def check_token_validity(ctx):
         users = []
         valid_count = 0
         expired_count = 0
+        unknown_count = 0
         
         with open('auths.txt', 'r') as auth_file:
             for line in auth_file:
@@ -519,27 +1045,37 @@ async def check_token_validity(ctx):
                     
                     # Test token validity
                     headers = {'Authorization': f'Bearer {access_token}'}
-                    test_response = requests.get('https://discord.com/api/v10/users/@me', headers=headers)
+                    try:
+                        test_response = discord_request('users/@me', 'GET', 'https://discord.com/api/v10/users/@me', headers=headers)
+                    except DiscordOutage:
+                        # Don't mark tokens expired because Discord is down
+                        unknown_count += 1
+                        users.append(f"⚠️ UNKNOWN {format_user(user_id)}")
+                        continue
                     
                     if test_response.status_code == 200:
                         status = "✅ VALID"
                         valid_count += 1
+                        cache_user_profile(user_id, test_response.json())
+                        record_validation(user_id, True)
                     else:
                         status = "❌ EXPIRED"
                         expired_count += 1
+                        record_validation(user_id, False)
                     
-                    users.append(f"{status} <@{user_id}>")
+                    users.append(f"{status} {format_user(user_id)}")
+        
+        save_profile_cache()
+        save_token_index()
         
         embed = discord.Embed(
             title="🔍 TOKEN VALIDITY CHECK",
-            description=f"**Valid:** {valid_count} | **Expired:** {expired_count}",
+            description=f"**Valid:** {valid_count} | **Expired:** {expired_count}" + (f" | **Unknown (API outage):** {unknown_count}" if unknown_count else ""),
             color=0x5865F2
         )
         
         if users:
-            users_text = "\n".join(users[:15])
-            if len(users) > 15:
-                users_text += f"\n... and {len(users) - 15} more"
+            users_text = join_field_lines(users, 15)
             embed.add_field(name="Token Status", value=users_text, inline=False)
         
         embed.add_field(
@@ -554,6 +1090,7 @@ async def check_token_validity(ctx):
         await ctx.send(f"❌ Error checking tokens: {str(error)}")
 
 @bot.hybrid_command(name='list_users')
+@timed
 async def list_authenticated_users(ctx):
     """List all authenticated users"""
     try:
@@ -572,7 +1109,7 @@ async def list_authenticated_users(ctx):
                 if len(parts) >= 3:
                     user_id = parts[0]
                     token_preview = parts[1][:10] + "..." if len(parts[1]) > 10 else parts[1]
-                    users.append(f"`{line_num}.` <@{user_id}> - `{token_preview}`")
+                    users.append(f"`{line_num}.` {format_user(user_id)} - `{token_preview}`")
         
         if not users:
             await ctx.send("❌ No valid authenticated users found.")
@@ -585,9 +1122,7 @@ async def list_authenticated_users(ctx):
         )
         
         # Split users into chunks to avoid field length limits
-        users_text = "\n".join(users[:20])  # Show first 20 users
-        if len(users) > 20:
-            users_text += f"\n\n... and {len(users) - 20} more users"
+        users_text = join_field_lines(users, 20, "more users")  # Show first 20 users
         
         embed.add_field(name="Users", value=users_text, inline=False)
         embed.add_field(
@@ -602,6 +1137,7 @@ async def list_authenticated_users(ctx):
         await ctx.send(f"❌ Error listing users: {str(error)}")
 
 @bot.hybrid_command(name='invite')
+@timed
 async def generate_invite(ctx):
     """Generate bot invite link for any server"""
     invite_url = f"https://discord.com/oauth2/authorize?client_id={CLIENT_ID}&permissions=8&scope=bot%20applications.commands"
@@ -625,6 +1161,7 @@ async def generate_invite(ctx):
     await ctx.send(embed=embed)
 
 @bot.hybrid_command(name='servers')
+@timed
 async def list_servers(ctx):
     """List all servers the bot is in"""
     try:
@@ -668,6 +1205,7 @@ async def list_servers(ctx):
         await ctx.send(f"❌ Error listing servers: {str(error)}")
 
 @bot.hybrid_command(name='server_age')
+@timed
 async def check_server_age(ctx, server_id: str = None):
     """Check how long the bot has been in a server"""
     try:
@@ -722,7 +1260,96 @@ async def check_server_age(ctx, server_id: str = None):
     except Exception as error:
         await ctx.send(f"❌ Error checking server age: {str(error)}")
 
+def stop_profiler():
+    """Stop the active profiler and save its stats, returns (path, summary)"""
+    global active_profiler
+    profiler = active_profiler
+    active_profiler = None
+    profiler.disable()
+    
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    stats_path = os.path.join(PROFILING_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.pstats")
+    profiler.dump_stats(stats_path)
+    
+    # Short summary of the heaviest functions for the embed
+    stats = pstats.Stats(profiler).sort_stats('cumulative')
+    top_functions = []
+    for filename, line, function in stats.fcn_list[:8]:
+        cumulative_time = stats.stats[(filename, line, function)][3]
+        top_functions.append(f"{cumulative_time:7.2f}s {os.path.basename(filename)}:{line}({function})")
+    
+    print(f"📊 Saved profile to {stats_path}")
+    return stats_path, "\n".join(top_functions)
+
+def build_profile_embed(stats_path, summary):
+    """Build the embed shown when a profiling window ends"""
+    embed = discord.Embed(
+        title="📊 PROFILE SAVED",
+        description=f"**File:** `{stats_path}`",
+        color=0x5865F2
+    )
+    
+    if command_timings:
+        slowest = sorted(command_timings.items(), key=lambda item: item[1]['max'], reverse=True)
+        timings_text = join_field_lines([
+            f"`{name}` - {stats['calls']} calls, avg {stats['total'] / stats['calls']:.2f}s, max {stats['max']:.2f}s, lag {stats['max_lag']:.2f}s"
+            for name, stats in slowest
+        ], 10)
+        embed.add_field(name="⏱️ Handler Timings", value=timings_text, inline=False)
+    
+    if summary:
+        embed.add_field(name="🔥 Top Functions", value=f"```{summary[:1000]}```", inline=False)
+    return embed
+
+async def stop_profiler_after(ctx, profiler, seconds):
+    """Stop a profiling window automatically and report it"""
+    await asyncio.sleep(seconds)
+    if active_profiler is profiler:
+        stats_path, summary = stop_profiler()
+        # Send to the channel, slash command followups expire after 15 minutes
+        await ctx.channel.send(content=f"{ctx.author.mention} profiling window finished", embed=build_profile_embed(stats_path, summary))
+
+@bot.hybrid_command(name='profile')
+@commands.is_owner()
+@timed
+async def profile_bot(ctx, action: str, seconds: int = 60):
+    """Start or stop a cProfile session (bot owner only)"""
+    global active_profiler
+    try:
+        action = action.lower()
+        
+        if action == 'start':
+            if active_profiler:
+                await ctx.send("⚠️ Profiler is already running. Use `!profile stop` first.")
+                return
+            
+            if seconds <= 0 or seconds > MAX_PROFILE_SECONDS:
+                await ctx.send(f"❌ Profiling window must be between 1 and {MAX_PROFILE_SECONDS} seconds.")
+                return
+            
+            active_profiler = cProfile.Profile()
+            active_profiler.enable()
+            asyncio.create_task(stop_profiler_after(ctx, active_profiler, seconds))
+            await ctx.send(f"📊 Profiling started for up to **{seconds}** seconds. Use `!profile stop` to finish early.")
+            print(f"📊 Profiler started by {ctx.author.name} for {seconds}s")
+        
+        elif action == 'stop':
+            if not active_profiler:
+                await ctx.send("❌ Profiler is not running.")
+                return
+            
+            stats_path, summary = stop_profiler()
+            await ctx.send(embed=build_profile_embed(stats_path, summary))
+        
+        else:
+            await ctx.send("❌ Usage: `!profile start [SECONDS]` or `!profile stop`")
+            
+    except Exception as error:
+        await ctx.send(f"❌ Error profiling: {str(error)}")
+        print(f"❌ Error in profile: {error}")
+
 @bot.hybrid_command(name='help')
+@timed
 async def show_help(ctx):
     """Show all available commands"""
     embed = discord.Embed(
@@ -738,7 +1365,7 @@ async def show_help(ctx):
     
     embed.add_field(
         name="🚀 MASS JOINING", 
-        value="`!djoin SERVER_ID` - Add ALL users to server\n`!servers` - List bot servers\n`!server_age [SERVER_ID]` - Check server age", 
+        value="`!djoin SERVER_ID [SERVER_ID ...]` - Add ALL users to servers\n`!djoin SERVER_ID days=N validated=N valid new` - Add only matching users (users with unknown times are skipped)\n`!servers` - List bot servers\n`!server_age [SERVER_ID]` - Check server age", 
         inline=False
     )
     
@@ -750,7 +1377,7 @@ async def show_help(ctx):
     
     embed.add_field(
         name="🔧 UTILITY", 
-        value="`!invite` - Get bot invite link\n`!help` - Show this help", 
+        value="`!invite` - Get bot invite link\n`!profile start|stop` - Profile the bot (owner)\n`!help` - Show this help", 
         inline=False
     )
     